@@ -1,28 +1,55 @@
+import asyncio
+import contextlib
 import logging
 import os
+import signal
+import socket
+import time
 from datetime import datetime
 from telegram import Update
 from telegram.ext import Application, CommandHandler, ContextTypes
 from telegram.constants import ParseMode
+from telegram.error import Conflict, TelegramError
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 from database import Database
 from scraper import MacOSScraper
+from log_setup import setup_logging
 import config
 
+# Постоянное имя экземпляра при работе нескольких реплик. Имя хоста в Docker
+# меняется при пересоздании контейнера, поэтому его лучше задать явно
+INSTANCE_NAME = (
+    os.environ.get('INSTANCE_NAME')
+    or getattr(config, 'INSTANCE_NAME', None)
+    or socket.gethostname()
+)
+
 # Настройка логирования
 log_dir = '/app/data' if os.path.exists('/app/data') else '.'
-log_path = os.path.join(log_dir, 'bot.log')
-
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO,
-    handlers=[
-        logging.FileHandler(log_path, encoding='utf-8'),
-        logging.StreamHandler()
-    ]
+# Реплики с общим каталогом data пишут (и ротируют) каждая свой файл
+if getattr(config, 'MULTI_INSTANCE', False):
+    log_path = os.path.join(log_dir, f'bot.{INSTANCE_NAME}.log')
+else:
+    log_path = os.path.join(log_dir, 'bot.log')
+
+log_listener = setup_logging(
+    log_path,
+    level=os.environ.get('LOG_LEVEL', getattr(config, 'LOG_LEVEL', 'INFO')),
+    log_format=getattr(config, 'LOG_FORMAT', 'text'),
+    rotation=getattr(config, 'LOG_ROTATION', 'size'),
+    max_bytes=getattr(config, 'LOG_MAX_BYTES', 10 * 1024 * 1024),
+    when=getattr(config, 'LOG_ROTATION_WHEN', 'midnight'),
+    backup_count=getattr(config, 'LOG_BACKUP_COUNT', 5)
 )
 logger = logging.getLogger(__name__)
+# APScheduler пишет INFO о каждом запуске задачи, включая частое продление аренды
+logging.getLogger('apscheduler.executors.default').setLevel(logging.WARNING)
+
+# Имя аренды, которую держит ведущий экземпляр (выполняет плановые проверки)
+LEADER_LEASE = 'scheduler'
+# Сколько раз повторять подготовку к получению команд (delete_webhook), если Telegram недоступен
+POLLING_BOOTSTRAP_RETRIES = 3
 
 
 class MacOSUpdateBot:
@@ -32,6 +59,20 @@ class MacOSUpdateBot:
         self.app = Application.builder().token(config.BOT_TOKEN).build()
         self.scheduler = AsyncIOScheduler()
         
+        # Несколько экземпляров работают с общей БД: проверки выполняет только ведущий
+        self.instance_id = f"{INSTANCE_NAME}:{os.getpid()}"
+        self.lease_ttl = getattr(config, 'LEASE_TTL', 60)
+        self.heartbeat_interval = getattr(config, 'LEASE_HEARTBEAT_INTERVAL', self.lease_ttl / 3)
+        if self.heartbeat_interval > self.lease_ttl / 2:
+            # Иначе аренда истекает между продлениями и ведущий постоянно меняется
+            logger.warning(
+                f"LEASE_HEARTBEAT_INTERVAL ({self.heartbeat_interval}) должен быть не больше "
+                f"половины LEASE_TTL ({self.lease_ttl}), используется {self.lease_ttl / 2}"
+            )
+            self.heartbeat_interval = self.lease_ttl / 2
+        self.is_leader = False
+        self.polling_task = None
+        
         # Регистрация команд
         self.app.add_handler(CommandHandler("start", self.start_command))
         self.app.add_handler(CommandHandler("help", self.help_command))
@@ -115,6 +156,8 @@ class MacOSUpdateBot:
 
         last_check = self.db.get_last_check()
         total_releases = self.db.count_releases()
+        lease = self.db.get_lease(LEADER_LEASE)
+        leader = lease['holder'] if lease else "нет"
         
         if last_check:
             check_time = datetime.fromisoformat(last_check['check_time'])
@@ -125,14 +168,16 @@ class MacOSUpdateBot:
                 f"🆕 Новых релизов: {last_check['new_releases']}\n"
                 f"✅ Статус: {last_check['status']}\n"
                 f"💾 Всего в БД: {total_releases}\n\n"
-                f"⏱ Интервал проверки: {config.CHECK_INTERVAL // 3600} час(а)"
+                f"⏱ Интервал проверки: {config.CHECK_INTERVAL // 3600} час(а)\n"
+                f"👑 Ведущий экземпляр: `{leader}`"
             )
         else:
             status_text = (
                 "📊 *Статус бота*\n\n"
                 "Проверок еще не было.\n"
                 f"💾 Всего в БД: {total_releases}\n"
-                f"⏱ Интервал проверки: {config.CHECK_INTERVAL // 3600} час(а)"
+                f"⏱ Интервал проверки: {config.CHECK_INTERVAL // 3600} час(а)\n"
+                f"👑 Ведущий экземпляр: `{leader}`"
             )
 
         await update.message.reply_text(status_text, parse_mode=ParseMode.MARKDOWN)
@@ -188,6 +233,12 @@ class MacOSUpdateBot:
             await update.message.reply_text("⛔ Эта команда доступна только администраторам.")
             return
 
+        if not self.refresh_lease():
+            await update.message.reply_text(
+                "ℹ️ Проверки выполняет другой экземпляр бота. Используйте /status для просмотра результатов."
+            )
+            return
+
         await update.message.reply_text("🔄 Запускаю проверку обновлений...")
         
         # Запускаем проверку
@@ -213,14 +264,38 @@ class MacOSUpdateBot:
     async def check_for_updates(self):
         """Проверка обновлений"""
         logger.info("Начинаю проверку обновлений...")
+        started = time.monotonic()
         
         # Проверяем, первый ли это запуск
         is_first_run = self.db.count_releases() == 0
         
-        result = self.scraper.scrape()
+        # Парсинг в отдельном потоке, чтобы не блокировать event loop (и продление аренды)
+        result = await asyncio.to_thread(self.scraper.scrape)
+        scrape_duration = time.monotonic() - started
+        
+        # За время загрузки аренду мог перехватить другой экземпляр
+        if not self.refresh_lease():
+            logger.warning(
+                "Аренда потеряна во время проверки, результаты не сохраняются",
+                extra={
+                    'event': 'check_cycle',
+                    'status': 'lease_lost',
+                    'scrape_duration': round(scrape_duration, 3),
+                    'duration': round(time.monotonic() - started, 3)
+                }
+            )
+            return
         
         if not result['success']:
-            logger.error(f"Ошибка при проверке: {result['error']}")
+            logger.error(
+                f"Ошибка при проверке: {result['error']}",
+                extra={
+                    'event': 'check_cycle',
+                    'status': 'error',
+                    'scrape_duration': round(scrape_duration, 3),
+                    'duration': round(time.monotonic() - started, 3)
+                }
+            )
             self.db.add_check_history(0, 0, f"Ошибка: {result['error']}")
             return
 
@@ -247,20 +322,38 @@ class MacOSUpdateBot:
             "Успешно"
         )
 
-        logger.info(f"Проверка завершена. Найдено релизов: {len(releases)}, новых: {len(new_releases)}")
-
         # Отправляем уведомления о новых релизах
+        sent, failed = 0, 0
         if new_releases:
             if is_first_run:
                 # При первом запуске отправляем только сводку
                 logger.info(f"Первый запуск: найдено {len(new_releases)} релизов, отправляю только сводку")
-                await self.send_first_run_summary(new_releases)
+                sent, failed = await self.send_first_run_summary(new_releases)
             else:
                 # При обычной работе отправляем уведомления о каждом новом релизе
-                await self.send_notifications(new_releases)
+                sent, failed = await self.send_notifications(new_releases)
+
+        # Итоговая запись о цикле, включая время рассылки
+        logger.info(
+            f"Проверка завершена. Найдено релизов: {len(releases)}, новых: {len(new_releases)}",
+            extra={
+                'event': 'check_cycle',
+                'status': 'ok',
+                'releases_found': len(releases),
+                'new_releases': len(new_releases),
+                'first_run': is_first_run,
+                'notifications_sent': sent,
+                'notifications_failed': failed,
+                'scrape_duration': round(scrape_duration, 3),
+                'duration': round(time.monotonic() - started, 3)
+            }
+        )
 
-    async def send_first_run_summary(self, releases: list):
-        """Отправка сводки при первом запуске (вместо спама всеми релизами)"""
+    async def send_first_run_summary(self, releases: list) -> tuple:
+        """
+        Отправка сводки при первом запуске (вместо спама всеми релизами).
+        Возвращает количество успешных и неудачных отправок.
+        """
         public_releases = [r for r in releases if r['release_type'] == 'public']
         beta_releases = [r for r in releases if r['release_type'] == 'beta']
         
@@ -290,6 +383,7 @@ class MacOSUpdateBot:
         
         message += "Используйте /latest для просмотра последних релизов."
         
+        sent, failed = 0, 0
         for chat_id in config.NOTIFICATION_TARGETS:
             try:
                 await self.app.bot.send_message(
@@ -298,12 +392,26 @@ class MacOSUpdateBot:
                     parse_mode=ParseMode.MARKDOWN,
                     disable_web_page_preview=True
                 )
-                logger.info(f"Сводка первого запуска отправлена в чат {chat_id}")
+                logger.info(
+                    f"Сводка первого запуска отправлена в чат {chat_id}",
+                    extra={'event': 'notification', 'chat_id': chat_id}
+                )
+                sent += 1
             except Exception as e:
-                logger.error(f"Ошибка при отправке в чат {chat_id}: {e}")
-
-    async def send_notifications(self, releases: list):
-        """Отправка уведомлений о новых релизах"""
+                logger.error(
+                    f"Ошибка при отправке в чат {chat_id}: {e}",
+                    extra={'event': 'notification', 'chat_id': chat_id}
+                )
+                failed += 1
+        
+        return sent, failed
+
+    async def send_notifications(self, releases: list) -> tuple:
+        """
+        Отправка уведомлений о новых релизах.
+        Возвращает количество успешных и неудачных отправок.
+        """
+        sent, failed = 0, 0
         for release in releases:
             message = self.format_release_message(release)
             
@@ -315,7 +423,15 @@ class MacOSUpdateBot:
                         parse_mode=ParseMode.MARKDOWN,
                         disable_web_page_preview=True
                     )
-                    logger.info(f"Уведомление отправлено в чат {chat_id}")
+                    logger.info(
+                        f"Уведомление отправлено в чат {chat_id}",
+                        extra={
+                            'event': 'notification',
+                            'chat_id': chat_id,
+                            'version': release['version'],
+                            'build': release['build']
+                        }
+                    )
                     
                     # Отмечаем как уведомленный
                     self.db.mark_as_notified(
@@ -323,8 +439,15 @@ class MacOSUpdateBot:
                         release['build'],
                         release['release_type']
                     )
+                    sent += 1
                 except Exception as e:
-                    logger.error(f"Ошибка при отправке в чат {chat_id}: {e}")
+                    logger.error(
+                        f"Ошибка при отправке в чат {chat_id}: {e}",
+                        extra={'event': 'notification', 'chat_id': chat_id}
+                    )
+                    failed += 1
+        
+        return sent, failed
 
     def format_release_message(self, release: dict) -> str:
         """Форматирование сообщения о релизе"""
@@ -348,28 +471,123 @@ class MacOSUpdateBot:
         
         return message
 
+    def refresh_lease(self) -> bool:
+        """Захватить или продлить аренду ведущего экземпляра"""
+        acquired = self.db.acquire_lease(LEADER_LEASE, self.instance_id, self.lease_ttl)
+        
+        if acquired != self.is_leader:
+            if acquired:
+                logger.info(f"Экземпляр {self.instance_id} стал ведущим")
+            else:
+                logger.warning(f"Экземпляр {self.instance_id} потерял статус ведущего")
+        
+        self.is_leader = acquired
+        return acquired
+
+    async def lease_heartbeat(self):
+        """Продление аренды (вызывается по расписанию)"""
+        # Продление не ждет Telegram: недоступность API не должна мешать удерживать аренду
+        self.refresh_lease()
+        if self.polling_task is None or self.polling_task.done():
+            self.polling_task = asyncio.create_task(self.sync_polling())
+
+    async def sync_polling(self):
+        """
+        Получение команд только на ведущем экземпляре (выполняется в фоновой задаче).
+
+        Telegram отдает getUpdates одному клиенту на токен, поэтому остальные
+        экземпляры не опрашивают API и ждут перехвата аренды.
+        """
+        updater = self.app.updater
+        try:
+            if self.is_leader and not updater.running:
+                await updater.start_polling(
+                    allowed_updates=Update.ALL_TYPES,
+                    bootstrap_retries=POLLING_BOOTSTRAP_RETRIES,
+                    error_callback=self.polling_error
+                )
+                logger.info("Получение команд включено")
+            elif not self.is_leader and updater.running:
+                await updater.stop()
+                logger.info("Получение команд остановлено")
+        except Exception as e:
+            # Повторим при следующем продлении аренды
+            logger.error(f"Ошибка при переключении получения команд: {e}")
+
+    def polling_error(self, error: TelegramError):
+        """Обработка ошибок getUpdates"""
+        if isinstance(error, Conflict):
+            # Кратковременно возможен при смене ведущего экземпляра
+            logger.debug(f"Конфликт getUpdates с другим экземпляром: {error}")
+        else:
+            logger.error(f"Ошибка при получении обновлений: {error}")
+
     async def scheduled_check(self):
         """Плановая проверка (вызывается по расписанию)"""
+        # Продлеваем аренду перед проверкой, чтобы не работать с истекшей
+        if not self.refresh_lease():
+            logger.debug("Плановая проверка пропущена: экземпляр не ведущий")
+            return
         await self.check_for_updates()
 
+    async def run(self):
+        """Основной цикл бота: работает до SIGINT/SIGTERM"""
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop_event.set)
+        
+        async with self.app:
+            await self.app.start()
+            self.scheduler.start()
+            await self.lease_heartbeat()
+            
+            logger.info("Бот запущен!")
+            logger.info(f"Интервал проверки: {config.CHECK_INTERVAL} секунд")
+            logger.info(f"Авторизованные пользователи: {config.ALLOWED_USER_IDS}")
+            logger.info(f"Цели уведомлений: {config.NOTIFICATION_TARGETS}")
+            logger.info(f"Экземпляр: {self.instance_id}, ведущий: {self.is_leader}")
+            
+            try:
+                await stop_event.wait()
+            finally:
+                await self.shutdown()
+
+    async def shutdown(self):
+        """Остановка планировщика и получения команд, освобождение аренды"""
+        self.scheduler.shutdown(wait=False)
+        try:
+            if self.polling_task is not None and not self.polling_task.done():
+                self.polling_task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await self.polling_task
+            if self.app.updater.running:
+                await self.app.updater.stop()
+            await self.app.stop()
+        except Exception as e:
+            logger.error(f"Ошибка при остановке бота: {e}")
+        finally:
+            # Освобождаем аренду, чтобы другой экземпляр перехватил ее без ожидания TTL
+            self.db.release_lease(LEADER_LEASE, self.instance_id)
+
     def start(self):
         """Запуск бота"""
         # Настройка планировщика
+        self.scheduler.add_job(
+            self.lease_heartbeat,
+            'interval',
+            seconds=self.heartbeat_interval,
+            id='lease_heartbeat'
+        )
         self.scheduler.add_job(
             self.scheduled_check,
             'interval',
             seconds=config.CHECK_INTERVAL,
             id='check_updates'
         )
-        self.scheduler.start()
-        
-        logger.info("Бот запущен!")
-        logger.info(f"Интервал проверки: {config.CHECK_INTERVAL} секунд")
-        logger.info(f"Авторизованные пользователи: {config.ALLOWED_USER_IDS}")
-        logger.info(f"Цели уведомлений: {config.NOTIFICATION_TARGETS}")
         
         # Запуск бота
-        self.app.run_polling(allowed_updates=Update.ALL_TYPES)
+        asyncio.run(self.run())
 
 
 if __name__ == '__main__':
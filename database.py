@@ -1,5 +1,6 @@
 import sqlite3
 import logging
+import time
 from datetime import datetime
 from typing import List, Dict, Optional
 
@@ -46,6 +47,19 @@ class Database:
                 )
             """)
             
+            # Таблица аренды (leader lease) для работы нескольких экземпляров
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS leases (
+                    name TEXT PRIMARY KEY,
+                    holder TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    heartbeat_at REAL NOT NULL
+                )
+            """)
+            
+            # WAL позволяет нескольким процессам читать БД во время записи
+            cursor.execute("PRAGMA journal_mode=WAL")
+            
             conn.commit()
             logger.info("База данных инициализирована")
 
@@ -187,3 +201,70 @@ class Database:
             cursor = conn.cursor()
             cursor.execute("SELECT COUNT(*) FROM releases")
             return cursor.fetchone()[0]
+
+    def acquire_lease(self, name: str, holder: str, ttl: float) -> bool:
+        """
+        Захватить или продлить аренду.
+
+        Аренда достается holder, если ее еще нет, она уже принадлежит holder
+        или истек срок действия. Возвращает True, если holder владеет арендой.
+        """
+        now = time.time()
+        try:
+            with sqlite3.connect(self.db_path, timeout=10) as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    INSERT OR IGNORE INTO leases (name, holder, expires_at, heartbeat_at)
+                    VALUES (?, ?, ?, ?)
+                """, (name, holder, now + ttl, now))
+                
+                if cursor.rowcount == 0:
+                    # Условное обновление атомарно: перехватить можно только свою
+                    # или просроченную аренду
+                    cursor.execute("""
+                        UPDATE leases
+                        SET holder = ?, expires_at = ?, heartbeat_at = ?
+                        WHERE name = ? AND (holder = ? OR expires_at < ?)
+                    """, (holder, now + ttl, now, name, holder, now))
+                
+                conn.commit()
+                return cursor.rowcount > 0
+        except Exception as e:
+            logger.error(f"Ошибка при захвате аренды {name}: {e}")
+            return False
+
+    def release_lease(self, name: str, holder: str):
+        """Освободить аренду, если она принадлежит holder"""
+        try:
+            with sqlite3.connect(self.db_path, timeout=10) as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    DELETE FROM leases
+                    WHERE name = ? AND holder = ?
+                """, (name, holder))
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Ошибка при освобождении аренды {name}: {e}")
+
+    def get_lease(self, name: str) -> Optional[Dict]:
+        """Получить информацию о действующей аренде"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT holder, expires_at, heartbeat_at
+                    FROM leases
+                    WHERE name = ? AND expires_at >= ?
+                """, (name, time.time()))
+                
+                row = cursor.fetchone()
+                if row:
+                    return {
+                        'holder': row[0],
+                        'expires_at': row[1],
+                        'heartbeat_at': row[2]
+                    }
+                return None
+        except Exception as e:
+            logger.error(f"Ошибка при чтении аренды {name}: {e}")
+            return None
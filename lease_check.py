@@ -0,0 +1,144 @@
+"""
+Проверка аренды ведущего экземпляра на нескольких процессах с общей БД.
+
+Запуск: python lease_check.py [количество процессов]
+
+Проверяется, что:
+- в любой момент аренда принадлежит не более чем одному процессу;
+- просроченную аренду перехватывает другой процесс;
+- после release_lease аренда сразу достается другому процессу.
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from database import Database
+
+LEASE = 'scheduler'
+TTL = 1.0
+
+
+class LeaseCheckError(Exception):
+    """Нарушено свойство аренды"""
+
+
+def ensure(condition: bool, message: str):
+    """Явная проверка (в отличие от assert не отключается при python -O)"""
+    if not condition:
+        raise LeaseCheckError(message)
+
+
+def worker(db_path: str, holder: str, delay: float, lifetime: float, results):
+    """Через delay продлевать аренду до конца lifetime, затем остановиться без освобождения"""
+    db = Database(db_path)
+    time.sleep(delay)
+    end = time.time() + lifetime
+    while time.time() < end:
+        before = time.time()
+        if db.acquire_lease(LEASE, holder, TTL):
+            results.put((holder, before, time.time()))
+        time.sleep(TTL / 5)
+    # Признак завершения процесса
+    results.put(None)
+
+
+def check_exclusive(processes: int) -> list:
+    """Процессы с разным временем жизни: аренда переходит только после истечения"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'lease.db')
+        Database(db_path)
+
+        results = multiprocessing.Queue()
+        procs = [
+            multiprocessing.Process(
+                target=worker,
+                # Первым стартует процесс с самым коротким временем жизни
+                args=(db_path, f"p{i}", i * TTL / 2, 2 * TTL * (i + 1), results)
+            )
+            for i in range(processes)
+        ]
+        for proc in procs:
+            proc.start()
+
+        # Очередь читаем до join, иначе процессы могут зависнуть на заполненном канале
+        records = []
+        finished = 0
+        while finished < processes:
+            record = results.get()
+            if record is None:
+                finished += 1
+            else:
+                records.append(record)
+
+        for proc in procs:
+            proc.join()
+
+    records.sort(key=lambda r: r[2])
+    holders = []
+    for i, (holder, before, after) in enumerate(records):
+        if not holders or holders[-1] != holder:
+            holders.append(holder)
+        # Последний успешный захват другим процессом до этого момента
+        previous = [r for r in records[:i] if r[0] != holder]
+        if previous:
+            _, prev_before, _ = previous[-1]
+            # Захват возможен только после истечения чужой аренды
+            ensure(
+                after > prev_before + TTL,
+                f"{holder} захватил аренду, пока она была у {previous[-1][0]}"
+            )
+
+    ensure(len(holders) == len(set(holders)), f"Аренда вернулась к прежнему владельцу: {holders}")
+    ensure(len(holders) > 1, "Просроченная аренда не была перехвачена")
+    return holders
+
+
+def try_acquire(db_path: str, holder: str, results):
+    """Однократная попытка захвата аренды"""
+    results.put(Database(db_path).acquire_lease(LEASE, holder, 60))
+
+
+def check_release():
+    """После release_lease аренда сразу доступна другому процессу"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'lease.db')
+        db = Database(db_path)
+        results = multiprocessing.Queue()
+
+        ensure(db.acquire_lease(LEASE, 'main', 60), "Не удалось захватить свободную аренду")
+
+        proc = multiprocessing.Process(target=try_acquire, args=(db_path, 'other', results))
+        proc.start()
+        acquired = results.get()
+        proc.join()
+        ensure(not acquired, "Действующая аренда перехвачена другим процессом")
+
+        db.release_lease(LEASE, 'main')
+
+        proc = multiprocessing.Process(target=try_acquire, args=(db_path, 'other', results))
+        proc.start()
+        acquired = results.get()
+        proc.join()
+        ensure(acquired, "Аренда не передана после release_lease")
+        lease = db.get_lease(LEASE)
+        ensure(lease is not None and lease['holder'] == 'other', "Аренда принадлежит не тому процессу")
+
+
+def main():
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+
+    try:
+        holders = check_exclusive(processes)
+        print(f"✅ Аренда эксклюзивна, порядок владельцев: {' -> '.join(holders)}")
+
+        check_release()
+        print("✅ release_lease сразу передает аренду другому процессу")
+    except LeaseCheckError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
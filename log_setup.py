@@ -0,0 +1,152 @@
+import atexit
+import copy
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+from datetime import datetime, timezone
+from typing import Optional
+
+# Стандартные атрибуты LogRecord - всё остальное считаем полями из extra
+_RESERVED_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {
+    'message', 'asctime', 'taskName'
+}
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+class JsonFormatter(logging.Formatter):
+    """Форматирование записей в JSON-lines (одна запись - одна строка)"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+
+        # Структурированные поля, переданные через extra={...}
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith('_'):
+                entry[key] = value
+
+        # Трассировка приходит из очереди уже отформатированной в exc_text
+        exc_text = record.exc_text
+        if not exc_text and record.exc_info:
+            exc_text = self.formatException(record.exc_info)
+        if exc_text:
+            entry['exc_info'] = exc_text
+
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, сохраняющий трассировку отдельным полем, а не в тексте сообщения"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class _QueueListener(logging.handlers.QueueListener):
+    """QueueListener, который можно безопасно останавливать повторно"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.running = False
+
+    def start(self):
+        super().start()
+        self.running = True
+
+    def stop(self):
+        if self.running:
+            self.running = False
+            super().stop()
+
+
+def _gzip_namer(name: str) -> str:
+    """Имя файла архива после ротации"""
+    return name + '.gz'
+
+
+def _gzip_rotator(source: str, dest: str):
+    """Сжатие файла лога при ротации"""
+    with open(source, 'rb') as f_in, gzip.open(dest, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+def _build_file_handler(log_path: str, rotation: str, max_bytes: int,
+                        when: str, backup_count: int) -> logging.Handler:
+    """Создать файловый обработчик с ротацией по размеру или по времени"""
+    if rotation == 'time':
+        handler = logging.handlers.TimedRotatingFileHandler(
+            log_path, when=when, backupCount=backup_count, encoding='utf-8'
+        )
+    else:
+        handler = logging.handlers.RotatingFileHandler(
+            log_path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8'
+        )
+
+    handler.namer = _gzip_namer
+    handler.rotator = _gzip_rotator
+    return handler
+
+
+def setup_logging(log_path: str,
+                  level: str = 'INFO',
+                  log_format: str = 'text',
+                  rotation: str = 'size',
+                  max_bytes: int = 10 * 1024 * 1024,
+                  when: str = 'midnight',
+                  backup_count: int = 5) -> logging.handlers.QueueListener:
+    """
+    Настройка логирования через очередь.
+
+    Корневой логгер только кладёт записи в очередь, а запись в файл и консоль
+    выполняется в фоновом потоке QueueListener, поэтому вызовы логгера
+    не блокируют event loop файловым вводом-выводом.
+    """
+    file_handler = _build_file_handler(log_path, rotation, max_bytes, when, backup_count)
+    if log_format == 'json':
+        file_handler.setFormatter(JsonFormatter())
+    else:
+        file_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    # Консоль (docker-compose logs) всегда в текстовом формате
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    listener = _QueueListener(
+        log_queue, file_handler, stream_handler, respect_handler_level=True
+    )
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(_QueueHandler(log_queue))
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+
+    listener.start()
+    # Дописываем оставшиеся в очереди записи при завершении процесса
+    atexit.register(stop_logging, listener)
+
+    return listener
+
+
+def stop_logging(listener: Optional[logging.handlers.QueueListener]):
+    """Остановить фоновый поток логирования"""
+    if listener is not None:
+        listener.stop()
@@ -32,6 +32,8 @@ class MacOSScraper:
 
         # Ищем все ссылки на InstallAssistant.pkg
         links = soup.find_all('a', href=re.compile(r'InstallAssistant\.pkg'))
+        # Отладочные сообщения по строкам формируем только при включенном DEBUG
+        debug = logger.isEnabledFor(logging.DEBUG)
         
         for link in links:
             download_url = link.get('href')
@@ -49,12 +51,14 @@ class MacOSScraper:
             # Находим родительскую строку таблицы
             row = link.find_parent('tr')
             if not row:
-                logger.debug("Ссылка не в таблице, пропускаем")
+                if debug:
+                    logger.debug("Ссылка не в таблице, пропускаем")
                 continue
             
             cells = row.find_all('td')
             if len(cells) < 2:
-                logger.debug("Недостаточно ячеек в строке")
+                if debug:
+                    logger.debug("Недостаточно ячеек в строке")
                 continue
             
             # Извлекаем версию и build из текста строки
@@ -63,14 +67,16 @@ class MacOSScraper:
             # Парсим версию (15.1, 15.2.1 и т.д.)
             version_match = re.search(r'(\d+\.\d+(?:\.\d+)?)', row_text)
             if not version_match:
-                logger.debug(f"Не найдена версия в строке: {row_text[:50]}")
+                if debug:
+                    logger.debug("Не найдена версия в строке: %s", row_text[:50])
                 continue
             version = version_match.group(1)
             
             # Парсим build (24B83, 24C5057p и т.д.)
             build_match = re.search(r'\b([0-9]{2}[A-Z][0-9]{2,}[a-z]?)\b', row_text)
             if not build_match:
-                logger.debug(f"Не найден build в строке: {row_text[:50]}")
+                if debug:
+                    logger.debug("Не найден build в строке: %s", row_text[:50])
                 continue
             build = build_match.group(1)
             
@@ -87,7 +93,8 @@ class MacOSScraper:
             if not any(r['version'] == version and r['build'] == build 
                      and r['release_type'] == release_type for r in releases):
                 releases.append(release)
-                logger.debug(f"Найден релиз: {version} ({build}) - {release_type}")
+                if debug:
+                    logger.debug("Найден релиз: %s (%s) - %s", version, build, release_type)
 
         logger.info(f"Всего найдено релизов: {len(releases)}")
         return releases